@@ -1,142 +1,211 @@
 #!/bin/env python3
 import argparse
-import re
+import sys
 import AnsiFmt as fmt
-from os import environ as env
+from functools import lru_cache
+from itertools import chain
+from os import environ as env, stat
 from shutil import get_terminal_size as term_size
 from subprocess import run
 from textwrap import wrap
 
-search = {
-    'section': re.compile(r'^(\w+.*[^\s*])\s*:'),
-    'title': re.compile(r'^\s*\[\s*(x)*\s*\]\s*(\w+.*)'),
-    'description': re.compile(r'^\s+(\w+.+)'),
-}
+# Stands in for the text when precomputing ANSI escape codes
+PLACEHOLDER = '\0'
+
+
+@lru_cache(maxsize=1)
+def term_width() -> int:
+    # Querying the terminal is a syscall, its size is only read once per run
+    return term_size()[0]
+
+
+@lru_cache(maxsize=None)
+def description_format(color, done: bool) -> tuple:
+    # Format a placeholder once and reuse the escape codes around it
+    text = fmt.strike(PLACEHOLDER) if done else PLACEHOLDER
+    prefix, suffix = fmt.dim(fmt.fg(text, color)).split(PLACEHOLDER)
+    return prefix, suffix
+
+
+@lru_cache(maxsize=None)
+def title_format(color, done: bool, indentation: int, icon: str) -> tuple:
+    # Escape codes, indentation and icon around a title, like above
+    text = fmt.strike(PLACEHOLDER) if done else PLACEHOLDER
+    formatted = fmt.fg(f"{' ' * indentation}{icon} {text}", color)
+    prefix, suffix = formatted.split(PLACEHOLDER)
+    return prefix, suffix
+
+
+def is_word_char(char: str) -> bool:
+    # Same set of characters as \w in a str regex
+    return char.isalnum() or char == '_'
+
+
+def match_section(line: str):
+    # Name of a section line such as 'Name:', None otherwise. The name has
+    # to start with a word character, be at least two characters long and
+    # not end with '*'. The last ':' that gives a valid name is used
+    if not is_word_char(line[:1]):
+        return None
+    text = line.partition('\n')[0]
+    colon = len(text)
+    while (colon := text.rfind(':', 0, colon)) != -1:
+        name = text[:colon].rstrip()
+        if len(name) >= 2 and name[-1] != '*':
+            return name
+    return None
+
+
+def match_title(stripped: str):
+    # (done, title) of a todo line such as '[x] title', None otherwise.
+    # Expects the line without leading whitespace, starting with '['.
+    # Only whitespace and x's are allowed between the brackets
+    close = stripped.find(']')
+    if close == -1:
+        return None
+    mark = stripped[1:close].strip()
+    if mark.strip('x'):
+        return None
+    title = stripped[close + 1:].lstrip().partition('\n')[0]
+    if not title or not is_word_char(title[0]):
+        return None
+    return 'x' in mark, title
+
+
+def match_description(stripped: str):
+    # Text of an indented description line, None otherwise. Expects the
+    # line without its leading whitespace. The text has to start with a
+    # word character and be at least two characters long
+    text = stripped.partition('\n')[0]
+    if len(text) < 2 or not is_word_char(text[0]):
+        return None
+    return text
 
 
 def wrap_text(string: str, indentation: int) -> list:
-    return wrap(string, term_size()[0] - indentation * 2)
+    return wrap(string, term_width() - indentation * 2)
 
 
 class TodoItem:
+    __slots__ = ('title', 'description', 'status')
+
     def __init__(self, title: str = None,
                  description: str = None,
                  status: bool = False):
-        self._status = status
-        self._title = title
-        self._description = description
+        self.title = title
+        self.description = description
+        self.status = status
 
-    @property
-    def status(self):
-        return self._status
 
-    @property
-    def title(self):
-        return self._title
+def iter_items(filepath: str):
+    # Yield (section, TodoItem) as soon as each item is complete, and
+    # (section, None) for every section line so empty sections show up too
+    nl_count = 0  # Count new lines, if > 2, add to general
+    current_section = "general"
+    # Keep track of current todo item, for parsing. The description is kept
+    # as a list of parts and joined once the item is complete
+    cur_title = cur_description = cur_status = cur_section = None
 
-    @property
-    def description(self):
-        return self._description
+    with open(filepath, buffering=65536) as f:
+        # A file never yields an empty line, one is added to mark the end of
+        # the list and flush the last todo item like any title change does
+        for line in chain(f, ('',)):
+            # The first character tells what a line can be: sections start
+            # with a word character, descriptions are indented and titles
+            # start with '[', possibly after some indentation
+            first = line[:1]
+            if first == '\n':
+                # set current section to be general if there are two blank
+                # lines before the todo item
+                if current_section != "general":
+                    nl_count += 1
+                    if nl_count == 2:
+                        nl_count = 0
+                        current_section = "general"
+                elif cur_description is not None:
+                    cur_description.append(line)
+                continue
+            elif first.isspace():
+                stripped = line.lstrip()
+                if stripped[:1] != '[':
+                    description = match_description(stripped)
+                    if description is not None:
+                        nl_count = 0
+                        if cur_description is None:
+                            cur_description = [description, '\n']
+                        else:
+                            cur_description.append(description)
+                    continue
+                todo = match_title(stripped)
+            elif first == '[':
+                todo = match_title(line)
+            elif first:
+                section = match_section(line) if ':' in line else None
+                if section is not None:
+                    nl_count = 0  # Reset lines count
+                    current_section = section
+                    yield current_section, None
+                continue
+            else:
+                todo = None, None  # End of the list
+
+            if todo is None:
+                continue
+            done, title = todo
+            if cur_title != title:
+                # Add last one after task change, if there is one
+                if cur_title is not None:
+                    if cur_description is not None:
+                        cur_description = ''.join(cur_description)
+                    yield cur_section, TodoItem(cur_title, cur_description,
+                                                cur_status)
+                # re-init
+                cur_title, cur_description = title, None
+                cur_status, cur_section = done, current_section
 
 
 def parse_file(filepath: str) -> dict:
     items = {'general': []}  # {'section': [TodoItem]}
-
-    with open(filepath) as f:
-        data = f.readlines()
-
-    nl_count = 0  # Count new lines, if > 2, add to general
     current_section = "general"
-    # Keep track of current todo item, for parsing
-    current_todo = {
-        'title': None,
-        'description': None,
-        'status': None,
-        'section': None,
-    }
-
-    for line in data:
-        if search['section'].match(line):
-            nl_count = 0  # Reset lines count
-            current_section = search['section'].match(line).group(1)
+    section_items = items[current_section]  # List of the current section
+    for section, item in iter_items(filepath):
+        # Only look the list up when items move to another section
+        if section != current_section:
+            current_section = section
             # initilize section if it isn't already added
-            if current_section not in items:
-                items[current_section] = []
-            continue
-        # set current section to be general if there are two blank lines
-        # before the todo item
-        elif current_section != "general" and line == '\n':
-            nl_count += 1
-            if nl_count == 2:
-                nl_count = 0
-                current_section = "general"
-        elif search['title'].match(line):
-            match = search['title'].match(line)
-            if current_todo['title'] != match.group(2):
-                # Add last one after task change but make sure it isn't None
-                if current_todo['title'] is not None:
-                    title = current_todo['title']
-                    description = current_todo['description']
-                    status = current_todo['status']
-                    todo = TodoItem(title, description, status)
-                    items[current_todo['section']].append(todo)
-                # re-init
-                for k in current_todo.keys():
-                    current_todo[k] = None
-                current_todo['title'] = match.group(2)
-                current_todo['status'] = match.group(1) == 'x'
-                current_todo['section'] = current_section
-            continue
-        elif search['description'].match(line):
-            nl_count = 0
-            description = search['description'].match(line).group(1)
-            if current_todo['description'] is None:
-                current_todo['description'] = description + '\n'
-            else:
-                current_todo['description'] += description
-            continue
-        elif line == '\n':
-            try:
-                current_todo['description'] += line
-            except TypeError:
-                continue
-    else:
-        if current_todo['title'] is not None:
-            title = current_todo['title']
-            description = current_todo['description']
-            status = current_todo['status']
-            todo = TodoItem(title, description, status)
-            items[current_todo['section']].append(todo)
-
+            section_items = items.setdefault(section, [])
+        if item is not None:
+            section_items.append(item)
     return items
 
 
-def print_item(item: TodoItem,
-               indentation: int = 4,
-               print_description: bool = True,
-               todo_color=1,
-               done_color=2,
-               todo_icon: str = '',
-               done_icon: str = ''):
+def format_item(item: TodoItem,
+                indentation: int = 4,
+                print_description: bool = True,
+                todo_color=1,
+                done_color=2,
+                todo_icon: str = '',
+                done_icon: str = '') -> list:
     done = item.status
-    title = item.title if not done else fmt.strike(item.title)
-    description = item.description
-
     color = done_color if done else todo_color
     icon = done_icon if done else todo_icon
 
-    print(fmt.fg(f"{' ' * indentation}{icon} {title}", color))
+    prefix, suffix = title_format(color, done, indentation, icon)
+    lines = [f"{prefix}{item.title}{suffix}"]
+
+    prefix, suffix = description_format(color, done)
 
     if print_description:
-        if description:
-            for unwrapped in [_ for _ in description.strip().split('\n')]:
+        if item.description:
+            for unwrapped in item.description.strip().split('\n'):
                 if unwrapped == '':
-                    print()
-                for line in [_ for _ in wrap_text(unwrapped, indentation)]:
-                    text = fmt.strike(line) if done else line
-                    text = fmt.dim(fmt.fg(text, color))
-                    print(' ' * (indentation + 1), text)
-        print()
+                    lines.append('')
+                for line in wrap_text(unwrapped, indentation):
+                    lines.append(f"{' ' * (indentation + 1)} "
+                                 f"{prefix}{line}{suffix}")
+        lines.append('')
+
+    return lines
 
 
 def main():
@@ -167,16 +236,23 @@ def main():
         run([env['EDITOR'], args.todo_list])
         return
     try:
-        todo_items = parse_file(args.todo_list)
+        if args.section == 'all':
+            todo_items = parse_file(args.todo_list)
+        else:
+            # A single section is formatted while parsing further down,
+            # without keeping the other sections. Only check the list exists
+            stat(args.todo_list)
+            todo_items = None
     except FileNotFoundError:
         print("File not found. Edit it? (y/N)")
         if input(': ').lower().startswith('y'):
             run([env['EDITOR'], args.todo_list])
-            return
+        return
 
     section_color, todo_color, done_color = args.color
 
-    if args.section != 'all' and args.section not in todo_items.keys():
+    if (todo_items is not None and args.section != 'all'
+            and args.section not in todo_items.keys()):
         print("Section not found")
         return
 
@@ -187,17 +263,35 @@ def main():
     elif args.indent_spaces is None:
         args.indent_spaces = 4
 
-    for section in sections:
-        if len(todo_items[section]) > 0:
-            if not args.no_section and len(sections) > 1:
-                print(fmt.fg(fmt.underline(section), section_color))
-            for item in todo_items[section]:
-                print_item(item,
+    def item_lines(item: TodoItem) -> list:
+        return format_item(item,
                            args.indent_spaces,
                            not args.no_description,
                            todo_color,
                            done_color)
 
+    # Collect the whole output and write it in one go
+    out = []
+    if todo_items is None:
+        found = args.section == 'general'
+        for section, item in iter_items(args.todo_list):
+            if section == args.section:
+                found = True
+                if item is not None:
+                    out += item_lines(item)
+        if not found:
+            print("Section not found")
+            return
+    else:
+        for section in sections:
+            if len(todo_items[section]) > 0:
+                if not args.no_section and len(sections) > 1:
+                    out.append(fmt.fg(fmt.underline(section), section_color))
+                for item in todo_items[section]:
+                    out += item_lines(item)
+    if out:
+        sys.stdout.write('\n'.join(out) + '\n')
+
 
 if __name__ == "__main__":
     main()